@@ -7,7 +7,20 @@ Safe by default: app.py controls DRY_RUN; this module exposes:
 """
 
 import os
-from typing import Dict
+import inspect
+from typing import Dict, Optional, Tuple
+
+# The (heavy) sp_api import and signature probe run once, on the first
+# cancel_mcf_fulfillment() call, so dry runs and skipped tickets never pay for
+# them. See _resolve().
+_RESOLVED = False
+_IMPORT_ERR: Optional[str] = None
+_FO_CLS = None
+_MARKETPLACES = None
+_EXC = Exception
+_CTOR_KW: Optional[str] = None
+_METHOD_KW: Optional[str] = None
+
 
 def _creds() -> Dict[str, str]:
     # Role is optional; if provided, it MUST be a ROLE ARN (not a user ARN).
@@ -24,61 +37,99 @@ def _creds() -> Dict[str, str]:
     return creds
 
 
-def build_cancel_payload(order_id: str) -> Dict:
-    return {
-        "operation": "cancel_fulfillment_order",
-        "sellerFulfillmentOrderId": order_id,
-        "reasonCode": "CustomerRequest",
-        "comment": "Automated cancellation request",
-    }
+def _param_names(fn) -> set:
+    try:
+        return set(inspect.signature(inspect.unwrap(fn)).parameters)
+    except (TypeError, ValueError):
+        return set()
 
 
-def cancel_mcf_fulfillment(order_id: str) -> Dict:
+def _probe(fo_cls) -> Tuple[Optional[str], Optional[str]]:
     """
-    Calls SP-API Fulfillment Outbound cancel_fulfillment_order.
-    Tries multiple method signatures to support different library versions.
+    Work out which keyword names this sp_api version uses, instead of
+    discovering them via failed calls:
+    - sandbox toggle on the constructor: "use_sandbox" | "sandbox" | None
+    - order id on cancel_fulfillment_order: snake_case | camelCase | None (positional)
     """
+    ctor = _param_names(fo_cls.__init__)
+    ctor_kw = "use_sandbox" if "use_sandbox" in ctor else ("sandbox" if "sandbox" in ctor else None)
+
+    cancel = getattr(fo_cls, "cancel_fulfillment_order", None)
+    meth = _param_names(cancel) if cancel is not None else set()
+    if "seller_fulfillment_order_id" in meth:
+        method_kw = "seller_fulfillment_order_id"
+    elif "sellerFulfillmentOrderId" in meth:
+        method_kw = "sellerFulfillmentOrderId"
+    else:
+        method_kw = None
+    return ctor_kw, method_kw
+
+
+def _resolve() -> None:
+    """Import sp_api (current class name, else the older one) and probe it; first call only."""
+    global _RESOLVED, _IMPORT_ERR, _FO_CLS, _MARKETPLACES, _EXC, _CTOR_KW, _METHOD_KW
+    if _RESOLVED:
+        return
+    _RESOLVED = True
     try:
-        # Prefer current class name; fall back to older one if needed
-        from sp_api.api import FulfillmentOutbound as _FO
+        from sp_api.api import FulfillmentOutbound as fo_cls
         from sp_api.base import Marketplaces, SellingApiException
-        fo_cls = _FO
     except Exception:
         try:
-            from sp_api.api import FbaOutbound as _FO  # older name
+            from sp_api.api import FbaOutbound as fo_cls  # older name
             from sp_api.base import Marketplaces, SellingApiException
-            fo_cls = _FO
         except Exception as e:
-            return {"ok": False, "error": f"SP-API client import failed: {e}"}
+            _IMPORT_ERR = f"SP-API client import failed: {e}"
+            return
+    if not hasattr(fo_cls, "cancel_fulfillment_order"):
+        _IMPORT_ERR = f"SP-API client {fo_cls.__name__} has no cancel_fulfillment_order"
+        return
+    _FO_CLS, _MARKETPLACES, _EXC = fo_cls, Marketplaces, SellingApiException
+    _CTOR_KW, _METHOD_KW = _probe(fo_cls)
+
+
+# Only the order id varies per call; copy this and fill it in
+_TEMPLATE = {
+    "operation": "cancel_fulfillment_order",
+    "sellerFulfillmentOrderId": "",
+    "reasonCode": "CustomerRequest",
+    "comment": "Automated cancellation request",
+}
+
+
+def build_cancel_payload(order_id: str) -> Dict:
+    d = _TEMPLATE.copy()
+    d["sellerFulfillmentOrderId"] = order_id
+    return d
+
+
+def cancel_mcf_fulfillment(order_id: str) -> Dict:
+    """
+    Calls SP-API Fulfillment Outbound cancel_fulfillment_order.
+    Supports different library versions by probing their signatures (see _probe).
+    """
+    _resolve()
+    if _IMPORT_ERR:
+        return {"ok": False, "error": _IMPORT_ERR}
 
     creds = _creds()
     use_sandbox = os.getenv("SPAPI_SANDBOX", "1") == "1"
 
-    # Instantiate client (handle param name differences across versions)
-    try:
-        fo = fo_cls(credentials=creds, marketplace=Marketplaces.US, use_sandbox=use_sandbox)
-    except TypeError:
-        try:
-            fo = fo_cls(credentials=creds, marketplace=Marketplaces.US, sandbox=use_sandbox)
-        except TypeError:
-            fo = fo_cls(credentials=creds, marketplace=Marketplaces.US)
+    # Instantiate client (param name differs across versions)
+    kwargs = {_CTOR_KW: use_sandbox} if _CTOR_KW else {}
+    fo = _FO_CLS(credentials=creds, marketplace=_MARKETPLACES.US, **kwargs)
 
     try:
-        # 1) Newer snake_case
-        try:
-            resp = fo.cancel_fulfillment_order(seller_fulfillment_order_id=order_id)
-        except TypeError:
-            # 2) camelCase (what your error message shows)
-            try:
-                resp = fo.cancel_fulfillment_order(sellerFulfillmentOrderId=order_id)
-            except TypeError:
-                # 3) positional only (some older builds)
-                resp = fo.cancel_fulfillment_order(order_id)
+        if _METHOD_KW:
+            resp = fo.cancel_fulfillment_order(**{_METHOD_KW: order_id})
+        else:
+            # positional only (some builds hide the name behind a decorator)
+            resp = fo.cancel_fulfillment_order(order_id)
 
         payload = getattr(resp, "payload", resp)
         return {"ok": True, "payload": payload}
 
-    except SellingApiException as e:
+    except _EXC as e:
         return {"ok": False, "error": str(e)}
     except TypeError as e:
         # Still a signature issue
@@ -7,30 +7,113 @@ Safe by default: DRY_RUN=true in rules.yaml prevents real cancellations.
 """
 
 import os
-import json
+import re
+import asyncio
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import orjson
 from dotenv import load_dotenv
 
+# Must run before the local imports below: classify (ANTHROPIC_MODEL) and
+# storage (CANCELBOT_DB) read the environment at import time. Once per process,
+# so main() can be called in a loop without re-reading .env.
+load_dotenv()
+
 from reamaze import (
     get_one_conversation,
+    get_unresolved_batch,
     add_private_note,
     add_tags,
     assign_to,
+    aclose as reamaze_aclose,
 )
 from classify import classify_ticket
 from amazon import cancel_mcf_fulfillment, build_cancel_payload
 from storage import init_db, log_action, db_path
 from utils import load_rules, normalize_shopify_order_id
 
-
-def main():
-    load_dotenv()
+# Rest of a fetched page, for callers that loop over main(page_size=N) in one
+# process. The default one-shot run (page_size=1) never leaves anything here.
+_PENDING: Deque[Dict[str, Any]] = deque()
+
+# Cheap local pre-check: no cancel-ish keyword and no order-looking number
+# means we can skip the Claude round-trip entirely.
+_CANCEL_HINT = re.compile(r"\b(?:cancel|stop|refund|don['’]?t\s+ship|hold\s+(?:my\s+|the\s+)?order)", re.I)
+_ORDER_NUM = re.compile(r"\d{4,}")
+
+
+def _prefilter(text: str) -> Optional[Dict[str, Any]]:
+    """Return a not_cancellation classification if text is obviously unrelated, else None."""
+    if _CANCEL_HINT.search(text) or _ORDER_NUM.search(text):
+        return None
+    return {
+        "intent": "not_cancellation",
+        "order_id": None,
+        "is_subscription_related": False,
+        "urgency": "normal",
+        "rationale": "Prefilter: no cancellation keywords or order number; Claude not called.",
+    }
+
+
+async def _next_conversation(page_size: int) -> Optional[Dict[str, Any]]:
+    if os.getenv("LIMIT_TO_CONVO", "").strip():
+        return await get_one_conversation()
+    if not _PENDING:
+        _PENDING.extend(await get_unresolved_batch(page_size))
+    return _PENDING.popleft() if _PENDING else None
+
+
+def _pretty(obj) -> str:
+    return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+
+
+async def _update_ticket(slug: str, note: str, tags: List[str], assignee: Optional[str]) -> Tuple[bool, str]:
+    """
+    Post the private note, add tags and assign concurrently (they're independent
+    Re:amaze calls). Returns the note's (ok, text) like add_private_note.
+    """
+    results = await asyncio.gather(
+        add_private_note(slug, note),
+        add_tags(slug, tags),
+        assign_to(slug, assignee),
+        return_exceptions=True,
+    )
+    # A network error on one call must not abandon the others or skip log_action
+    for r in results:
+        if isinstance(r, BaseException) and not isinstance(r, Exception):
+            raise r  # cancellation / interrupt: don't swallow
+    results = [(False, str(r)) if isinstance(r, Exception) else r for r in results]
+    for name, (ok, text) in zip(("note", "tags", "assign"), results):
+        if not ok:
+            print(f"[Re:amaze] {name} failed for {slug}: {text}")
+    return results[0]
+
+
+def main(page_size: int = 1):
+    """
+    Handle one ticket. The launchd one-shot fetches just that ticket; a caller
+    that loops over main() in one process can pass a larger page_size so the
+    rest of the page is served from _PENDING on later calls.
+    """
+    asyncio.run(_main_async(page_size))
+
+
+async def _main_async(page_size: int):
+    try:
+        await _handle_next(page_size)
+    finally:
+        await reamaze_aclose()
+
+
+async def _handle_next(page_size: int):
     rules = load_rules()
     init_db()
 
     print("=== cancelbot: Re:amaze + Claude + SP-API ===")
     dry_run = bool(rules.get("dry_run", True))
 
-    convo = get_one_conversation()
+    convo = await _next_conversation(page_size)
     if not convo:
         print("[Re:amaze] No unresolved conversations found or auth error.")
         return
@@ -45,8 +128,9 @@ def main():
     combined = f"{subject}\n\n{last_msg_text}".strip() or subject
 
     # ---- classify with Claude ----
-    cls = classify_ticket(combined)
-    print("[Claude] classification:", json.dumps(cls, indent=2))
+    cls = _prefilter(combined) or classify_ticket(combined)
+    cls_json = _pretty(cls)
+    print("[Claude] classification:", cls_json)
 
     intent = cls.get("intent", "not_cancellation")
     order_id = cls.get("order_id")
@@ -56,11 +140,9 @@ def main():
     if intent != "cancel_order":
         note = (
             "[POC] Not a cancellation based on classifier.\n\n"
-            f"Classifier JSON:\n```json\n{json.dumps(cls, indent=2)}\n```"
+            f"Classifier JSON:\n```json\n{cls_json}\n```"
         )
-        ok, resp = add_private_note(slug, note)
-        add_tags(slug, rules["tags"].get("not_cancellation", []))
-        assign_to(slug, rules.get("assignee"))
+        ok, resp = await _update_ticket(slug, note, rules["tags"].get("not_cancellation", []), rules.get("assignee"))
         log_action(slug, order_id, "not_cancellation", ok, {"classifier": cls})
         print(f"[Re:amaze] Noted classification; tags added; assigned to {rules.get('assignee')}. DB:", db_path())
         return
@@ -71,9 +153,7 @@ def main():
             "[POC] Cancellation intent detected but no order id found.\n"
             "Tagged needs-human and assigned."
         )
-        ok, resp = add_private_note(slug, note)
-        add_tags(slug, rules["tags"].get("failure", []))
-        assign_to(slug, rules.get("assignee"))
+        ok, resp = await _update_ticket(slug, note, rules["tags"].get("failure", []), rules.get("assignee"))
         log_action(slug, None, "cancel_order", False, {"error": "missing_order_id", "classifier": cls})
         print(f"[Re:amaze] Missing order id → needs-human. DB:", db_path())
         return
@@ -85,12 +165,10 @@ def main():
         note = (
             "✅ [POC/DRY RUN] Classified as cancellation.\n"
             "No Amazon call made. Here is the payload that WOULD be sent:\n\n"
-            f"```json\n{json.dumps(payload, indent=2)}\n```\n"
-            f"Classifier: {json.dumps(cls, indent=2)}"
+            f"```json\n{_pretty(payload)}\n```\n"
+            f"Classifier: {cls_json}"
         )
-        ok, resp = add_private_note(slug, note)
-        add_tags(slug, rules["tags"].get("success", []))
-        assign_to(slug, rules.get("assignee"))
+        ok, resp = await _update_ticket(slug, note, rules["tags"].get("success", []), rules.get("assignee"))
         log_action(slug, order_id, "cancel_order", True, {"dry_run": True, "payload": payload, "classifier": cls})
         print("[DRY RUN] Note posted; tags added; assigned; logged.")
         return
@@ -100,21 +178,19 @@ def main():
     if result["ok"]:
         note = (
             f"✅ Auto-cancel success via SP-API for `{order_id}`.\n\n"
-            f"Response:\n```json\n{json.dumps(result['payload'], indent=2)}\n```"
+            f"Response:\n```json\n{_pretty(result['payload'])}\n```"
         )
-        add_private_note(slug, note)
-        add_tags(slug, rules["tags"].get("success", []))
+        tags = rules["tags"].get("success", [])
         success = True
     else:
         note = (
             f"⚠️ Auto-cancel failed for `{order_id}`.\n\n"
             f"Error:\n```\n{result['error']}\n```\nTagged needs-human."
         )
-        add_private_note(slug, note)
-        add_tags(slug, rules["tags"].get("failure", []))
+        tags = rules["tags"].get("failure", [])
         success = False
 
-    assign_to(slug, rules.get("assignee"))
+    await _update_ticket(slug, note, tags, rules.get("assignee"))
     log_action(slug, order_id, "cancel_order", success, result)
     print(f"[SP-API] {'Success' if success else 'Failure'}; ticket updated; DB:", db_path())
 
@@ -2,15 +2,25 @@
 Claude classifier with robust JSON parsing (no response_format arg required).
 
 - Uses ANTHROPIC_MODEL if set; else tries a short fallback list you can edit.
-- Forces JSON via instruction and validates/repairs output if needed.
+- Forces JSON via instruction and validates/repairs output if needed
+  (schema-generated _validate: defaults, types, allowed values).
 - Never crashes; returns a safe default on error.
+- Exact-match results are cached per (prompt/schema version, model, text) in cancelbot.db.
+- Streams the reply and stops reading once the JSON object is complete.
+- Skips models that returned 404 before (remembered in ~/.cancelbot_model).
+- SYSTEM is sent as a cache_control block so the static prefix can be reused.
 """
 
-import os, json, re
-from typing import Dict, Any, List
+import os, re
+import hashlib
+from pathlib import Path
+from typing import Dict, Any, Iterable, List, Optional, Set, Tuple
 
+import orjson
 from anthropic import Anthropic, NotFoundError  # pip install -U anthropic
 
+from storage import classifier_cache_get, classifier_cache_put
+
 SYSTEM = """You are a precise CX triage helper.
 Respond with ONLY a single JSON object (no prose, no code fences), with keys:
 - intent: "cancel_order" | "not_cancellation"
@@ -20,9 +30,15 @@ Respond with ONLY a single JSON object (no prose, no code fences), with keys:
 - rationale: short string
 """
 
+# Static prefix -> marked ephemeral so Anthropic can serve it from prompt cache
+_SYSTEM_BLOCKS = [{"type": "text", "text": SYSTEM, "cache_control": {"type": "ephemeral"}}]
+
+# Set in the environment or .env (app.py loads .env before importing this module)
+_EXPLICIT_MODEL = os.getenv("ANTHROPIC_MODEL", "").strip()
+
 # Use the models your key actually lists (adjust as you like)
 FALLBACK_MODELS: List[str] = [
-    os.getenv("ANTHROPIC_MODEL", "").strip() or "",
+    _EXPLICIT_MODEL,
     "claude-sonnet-4-20250514",
     "claude-3-7-sonnet-20250219",
     "claude-3-5-haiku-20241022",
@@ -30,6 +46,55 @@ FALLBACK_MODELS: List[str] = [
 ]
 FALLBACK_MODELS = [m for m in FALLBACK_MODELS if m]
 
+# Models that returned 404 are skipped on later calls (persisted in
+# ~/.cancelbot_model). Only NotFoundError counts; overloads, timeouts and bad
+# JSON never demote a model. The record is tied to FALLBACK_MODELS, so editing
+# the list (or ANTHROPIC_MODEL) starts from scratch, and an explicitly set
+# ANTHROPIC_MODEL is always tried first.
+_NOT_FOUND_FILE = Path.home() / ".cancelbot_model"
+
+def _read_not_found() -> Set[str]:
+    try:
+        saved = orjson.loads(_NOT_FOUND_FILE.read_bytes())
+    except (OSError, orjson.JSONDecodeError):
+        return set()
+    if not isinstance(saved, dict) or saved.get("models") != FALLBACK_MODELS:
+        return set()
+    return set(saved.get("not_found") or []) & set(FALLBACK_MODELS)
+
+_NOT_FOUND: Set[str] = _read_not_found()
+
+def _remember_not_found(model: str) -> None:
+    if model in _NOT_FOUND:
+        return
+    _NOT_FOUND.add(model)
+    try:
+        _NOT_FOUND_FILE.write_bytes(orjson.dumps({"models": FALLBACK_MODELS, "not_found": sorted(_NOT_FOUND)}))
+    except OSError:
+        pass
+
+def _models_to_try() -> List[str]:
+    models = [m for m in FALLBACK_MODELS if m == _EXPLICIT_MODEL or m not in _NOT_FOUND]
+    return models or FALLBACK_MODELS
+
+def _cache_key(model: str, message_text: str) -> bytes:
+    # _CACHE_VERSION (set below, after _SCHEMA) retires old rows when the prompt/schema change
+    return hashlib.blake2b(
+        _CACHE_VERSION + model.encode() + b"\0" + message_text.encode(), digest_size=16
+    ).digest()
+
+def _cache_get(key: bytes) -> Optional[Dict[str, Any]]:
+    val = classifier_cache_get(key)
+    if val is None:
+        return None
+    try:
+        return _validate(orjson.loads(val))
+    except (orjson.JSONDecodeError, ValueError):
+        return None
+
+def _cache_put(key: bytes, data: Dict[str, Any]) -> None:
+    classifier_cache_put(key, orjson.dumps(data))
+
 _DEF = {
     "intent": "not_cancellation",
     "order_id": None,
@@ -40,11 +105,44 @@ _DEF = {
 
 def _extract_text(resp) -> str:
     """Concatenate text blocks safely (Anthropic returns a list of content blocks)."""
-    parts = []
-    for block in getattr(resp, "content", []) or []:
-        if getattr(block, "type", None) == "text":
-            parts.append(getattr(block, "text", "") or "")
-    return "".join(parts).strip()
+    _getattr = getattr
+    blocks = _getattr(resp, "content", None) or ()
+    if len(blocks) == 1:  # the usual case: no list/join needed
+        b = blocks[0]
+        return (_getattr(b, "text", "") or "").strip() if _getattr(b, "type", None) == "text" else ""
+    return "".join(
+        _getattr(b, "text", "") or "" for b in blocks if _getattr(b, "type", None) == "text"
+    ).strip()
+
+def _read_until_json_closes(chunks: Iterable[str]) -> Tuple[str, bool]:
+    """
+    Accumulate streamed text and stop as soon as the first top-level {...} is
+    balanced (braces inside JSON strings are ignored). Returns (text, closed);
+    closed=False means the stream ran to the end without a balanced object.
+    """
+    buf: List[str] = []
+    depth, in_str, esc = 0, False, False
+    for chunk in chunks:
+        for i, ch in enumerate(chunk):
+            if in_str:
+                if esc:
+                    esc = False
+                elif ch == "\\":
+                    esc = True
+                elif ch == '"':
+                    in_str = False
+            elif ch == "{":
+                depth += 1
+            elif depth:
+                if ch == '"':
+                    in_str = True
+                elif ch == "}":
+                    depth -= 1
+                    if not depth:
+                        buf.append(chunk[: i + 1])
+                        return "".join(buf), True
+        buf.append(chunk)
+    return "".join(buf), False
 
 def _coerce_json(txt: str) -> Dict[str, Any]:
     """
@@ -52,48 +150,96 @@ def _coerce_json(txt: str) -> Dict[str, Any]:
     Always return a dict or raise.
     """
     try:
-        return json.loads(txt)
+        return orjson.loads(txt)
     except Exception:
         pass
     # Strip common ```json ... ``` wrappers
     m = re.search(r"\{.*\}", txt, flags=re.DOTALL)
     if m:
-        return json.loads(m.group(0))
+        return orjson.loads(m.group(0))
     raise ValueError("No valid JSON object found.")
 
+# Response schema: (key, default, allowed types, allowed values or None).
+# Missing keys, wrong types and out-of-range values all fall back to the default.
+_SCHEMA = [
+    ("intent", "not_cancellation", "str", ("cancel_order", "not_cancellation")),
+    ("order_id", None, "(str, type(None))", None),
+    ("is_subscription_related", False, "bool", None),
+    ("urgency", "normal", "str", ("low", "normal", "high")),
+    ("rationale", "", "str", None),
+]
+
+def _build_validator():
+    """
+    Generate a flat, straight-line normalizer for _SCHEMA (one exec per process)
+    instead of looping over keys / chained setdefault calls per response.
+    """
+    src = [
+        "def _validate(d):",
+        "    if not isinstance(d, dict):",
+        "        raise ValueError('Classifier JSON is not an object.')",
+        # Claude sometimes emits numeric ids (91057); keep them as strings
+        "    v = d.get('order_id')",
+        "    if type(v) is int:",
+        "        d['order_id'] = str(v)",
+    ]
+    for key, default, types, choices in _SCHEMA:
+        cond = f"v is _MISSING or not isinstance(v, {types})"
+        if choices:
+            cond += f" or v not in {choices!r}"
+        src += [
+            f"    v = d.get({key!r}, _MISSING)",
+            f"    if {cond}:",
+            f"        d[{key!r}] = {default!r}",
+        ]
+    src.append("    return d")
+    ns = {"_MISSING": object()}
+    exec("\n".join(src), ns)
+    return ns["_validate"]
+
+_validate = _build_validator()
+
+# Fingerprint of the classification contract, mixed into every cache key
+_CACHE_VERSION = hashlib.blake2b(orjson.dumps([SYSTEM, _SCHEMA]), digest_size=8).digest()
+
 def classify_ticket(message_text: str) -> Dict[str, Any]:
     api_key = os.getenv("ANTHROPIC_API_KEY")
     if not api_key:
         out = dict(_DEF); out["rationale"] = "No ANTHROPIC_API_KEY set."
         return out
 
-    client = Anthropic(api_key=api_key)
+    client = Anthropic(
+        api_key=api_key,
+        default_headers={"anthropic-beta": "prompt-caching-2024-07-31"},
+    )
     last_err = None
 
-    for model in FALLBACK_MODELS:
+    for model in _models_to_try():
+        key = _cache_key(model, message_text)
+        cached = _cache_get(key)
+        if cached is not None:
+            return cached
         try:
-            resp = client.messages.create(
+            # Stream and hang up once the JSON object closes (skips trailing tokens)
+            with client.messages.stream(
                 model=model,
                 max_tokens=400,
                 temperature=0,
-                system=SYSTEM,
+                system=_SYSTEM_BLOCKS,
                 messages=[{"role": "user", "content": message_text}],
-            )
-            txt = _extract_text(resp)
+            ) as stream:
+                txt, closed = _read_until_json_closes(stream.text_stream)
+                if not closed:
+                    txt = _extract_text(stream.get_final_message())
             if not txt:
                 raise ValueError("Empty text returned from model.")
-            data = _coerce_json(txt)
-
-            # Minimal normalization
-            data.setdefault("intent", "not_cancellation")
-            data.setdefault("order_id", None)
-            data.setdefault("is_subscription_related", False)
-            data.setdefault("urgency", "normal")
-            data.setdefault("rationale", "")
+            data = _validate(_coerce_json(txt))
+            _cache_put(key, data)
             return data
 
         except NotFoundError as e:
             last_err = f"Model not found: {model} ({e})"
+            _remember_not_found(model)
             continue
         except Exception as e:
             last_err = f"Anthropic error on {model}: {e}"
@@ -34,6 +34,10 @@ import requests
 from dotenv import load_dotenv
 
 
+# (connect, read): fail fast on DNS/TCP trouble, still allow slow responses
+_TIMEOUT = (3.05, 10)
+
+
 # ------------------------- Re:amaze helpers ------------------------- #
 
 def reamaze_base() -> str:
@@ -57,7 +61,7 @@ def get_one_conversation() -> Optional[dict]:
             r = requests.get(
                 f"{base}/conversations/{slug}.json",
                 auth=auth,
-                timeout=20
+                timeout=_TIMEOUT
             )
             r.raise_for_status()
             return r.json().get("conversation")
@@ -66,7 +70,7 @@ def get_one_conversation() -> Optional[dict]:
             f"{base}/conversations.json",
             auth=auth,
             params={"brand": brand, "state": "unresolved", "per_page": 1},
-            timeout=20,
+            timeout=_TIMEOUT,
         )
         r.raise_for_status()
         convs = r.json().get("conversations", [])
@@ -90,7 +94,7 @@ def add_private_note(slug: str, body: str):
         f"{base}/conversations/{slug}/messages.json",
         auth=auth,
         json={"message": {"body": body, "private": True}},
-        timeout=20,
+        timeout=_TIMEOUT,
     )
     return r.ok, r.text
 
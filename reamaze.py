@@ -1,10 +1,49 @@
 """
 Re:amaze helpers. Auth is HTTP Basic with (login_email, api_token).
+
+All helpers are async and share one httpx.AsyncClient (HTTP/2, keep-alive), so
+concurrent calls for a ticket multiplex over a single connection. The client is
+created lazily inside the running event loop; call aclose() before that loop ends.
 """
 
 import os
+import asyncio
 from typing import Optional, List, Tuple, Dict, Any
-import requests
+import httpx
+import orjson
+
+# Fail fast on DNS/TCP trouble (connect), still allow slow responses (read)
+_TIMEOUT = httpx.Timeout(10, connect=3.05)
+
+# Connection errors are retried by the transport; 429/5xx are retried below,
+# for idempotent verbs only, so a note POST is never sent twice.
+_RETRIES = 2
+_BACKOFF = 0.2
+_RETRY_STATUS = {429, 502, 503, 504}
+_IDEMPOTENT = {"GET", "PUT"}
+
+_CLIENT: Optional[httpx.AsyncClient] = None
+
+
+def _client() -> httpx.AsyncClient:
+    global _CLIENT
+    if _CLIENT is None:
+        _CLIENT = httpx.AsyncClient(
+            timeout=_TIMEOUT,
+            transport=httpx.AsyncHTTPTransport(
+                http2=True,
+                retries=_RETRIES,
+                limits=httpx.Limits(max_keepalive_connections=4),
+            ),
+        )
+    return _CLIENT
+
+
+async def aclose() -> None:
+    global _CLIENT
+    if _CLIENT is not None:
+        await _CLIENT.aclose()
+        _CLIENT = None
 
 
 def _base() -> str:
@@ -16,67 +55,80 @@ def _auth() -> Tuple[str, str]:
     return (os.environ["REAMAZE_EMAIL"], os.environ["REAMAZE_API_TOKEN"])
 
 
-def get_one_conversation() -> Optional[Dict[str, Any]]:
-    base = _base()
-    auth = _auth()
-    brand = os.environ["REAMAZE_BRAND"]
+async def _request(method: str, path: str, **kwargs) -> httpx.Response:
+    for attempt in range(_RETRIES + 1):
+        r = await _client().request(method, f"{_base()}{path}", auth=_auth(), **kwargs)
+        if method not in _IDEMPOTENT or r.status_code not in _RETRY_STATUS or attempt == _RETRIES:
+            return r
+        await asyncio.sleep(_BACKOFF * (2 ** attempt))
+
+
+async def get_one_conversation() -> Optional[Dict[str, Any]]:
     slug = os.getenv("LIMIT_TO_CONVO", "").strip()
 
     if slug:
-        r = requests.get(f"{base}/conversations/{slug}.json", auth=auth, timeout=20)
-        if r.ok:
+        r = await _request("GET", f"/conversations/{slug}.json")
+        if r.is_success:
             return r.json().get("conversation")
         print("[Re:amaze] Could not fetch slug:", slug, r.text)
         return None
 
-    r = requests.get(
-        f"{base}/conversations.json",
-        auth=auth,
-        params={"brand": brand, "state": "unresolved", "per_page": 1},
-        timeout=20,
+    convs = await get_unresolved_batch(1)
+    return convs[0] if convs else None
+
+
+async def get_unresolved_batch(n: int = 25) -> List[Dict[str, Any]]:
+    """Up to n unresolved conversations in one request ([] on auth/HTTP error)."""
+    r = await _request(
+        "GET",
+        "/conversations.json",
+        params={"brand": os.environ["REAMAZE_BRAND"], "state": "unresolved", "per_page": n},
     )
     try:
         r.raise_for_status()
-    except requests.HTTPError as e:
+    except httpx.HTTPStatusError as e:
         if r.status_code == 403:
             print("[Re:amaze] 403 Forbidden – ensure REAMAZE_EMAIL is the SAME account that generated the token, and REAMAZE_BRAND matches the subdomain.")
         else:
             print(f"[Re:amaze] HTTP {r.status_code}: {r.text}")
-        return None
+        return []
 
-    convs = r.json().get("conversations", [])
-    return convs[0] if convs else None
+    return r.json().get("conversations", [])
+
+
+async def add_private_note(slug: str, body: str) -> Tuple[bool, str]:
+    # Encode once with orjson rather than via httpx's stdlib json= path
+    return await add_private_note_raw(slug, orjson.dumps({"message": {"body": body, "private": True}}))
 
 
-def add_private_note(slug: str, body: str) -> Tuple[bool, str]:
-    r = requests.post(
-        f"{_base()}/conversations/{slug}/messages.json",
-        auth=_auth(),
-        json={"message": {"body": body, "private": True}},
-        timeout=20,
+async def add_private_note_raw(slug: str, payload: bytes) -> Tuple[bool, str]:
+    """POST an already-encoded {"message": {...}} JSON body."""
+    r = await _request(
+        "POST",
+        f"/conversations/{slug}/messages.json",
+        content=payload,
+        headers={"Content-Type": "application/json"},
     )
-    return r.ok, r.text
+    return r.is_success, r.text
 
 
-def add_tags(slug: str, tags: List[str]) -> Tuple[bool, str]:
+async def add_tags(slug: str, tags: List[str]) -> Tuple[bool, str]:
     if not tags:
         return True, "no-op"
-    r = requests.post(
-        f"{_base()}/conversations/{slug}/tags.json",
-        auth=_auth(),
+    r = await _request(
+        "POST",
+        f"/conversations/{slug}/tags.json",
         json={"tags": tags},
-        timeout=20,
     )
-    return r.ok, r.text
+    return r.is_success, r.text
 
 
-def assign_to(slug: str, staff_name: Optional[str]) -> Tuple[bool, str]:
+async def assign_to(slug: str, staff_name: Optional[str]) -> Tuple[bool, str]:
     if not staff_name:
         return True, "no-op"
-    r = requests.put(
-        f"{_base()}/conversations/{slug}.json",
-        auth=_auth(),
+    r = await _request(
+        "PUT",
+        f"/conversations/{slug}.json",
         json={"conversation": {"assignee_name": staff_name}},
-        timeout=20,
     )
-    return r.ok, r.text
+    return r.is_success, r.text
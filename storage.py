@@ -1,34 +1,144 @@
 """
 Tiny SQLite logger for actions. File lives in the working directory.
+
+One connection is opened by init_db() and reused for every insert (WAL mode).
+log_action() only enqueues the row; a daemon thread drains the queue and writes
+batches in a single transaction, so callers never wait on the commit. Pending
+rows are flushed at exit (or explicitly via flush()).
+
+Also holds classifier_cache: exact-match classifier results keyed by a content
+hash, so re-running a ticket doesn't pay for another Claude call.
 """
 
 import sqlite3
 import os
-import json
+import atexit
+import queue
+import threading
 from typing import Optional
 
+import orjson
+
 _DB = os.getenv("CANCELBOT_DB", "cancelbot.db")
+_CONN: Optional[sqlite3.Connection] = None
+
+_Q = queue.Queue()
+_WRITER: Optional[threading.Thread] = None
+_STOP = object()
+_BATCH_MAX = 100
+_IN_FLIGHT = 0  # rows the writer has taken off _Q but not finished writing
+_LOCK = threading.Lock()  # writer thread and cache calls share _CONN
+
+_INSERT_SQL = "INSERT INTO actions(convo_slug, order_id, intent, success, result_json) VALUES (?, ?, ?, ?, ?)"
 
 def db_path() -> str:
     return os.path.abspath(_DB)
 
 def init_db():
-    with sqlite3.connect(_DB) as c:
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS actions(
-                id INTEGER PRIMARY KEY,
-                convo_slug TEXT,
-                order_id TEXT,
-                intent TEXT,
-                success INTEGER,
-                result_json TEXT,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
+    global _CONN, _WRITER
+    if _CONN is not None:
+        return
+    c = sqlite3.connect(_DB, isolation_level=None, check_same_thread=False)
+    c.execute("PRAGMA journal_mode=WAL")
+    c.execute("PRAGMA synchronous=NORMAL")
+    c.execute("PRAGMA temp_store=MEMORY")
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS actions(
+            id INTEGER PRIMARY KEY,
+            convo_slug TEXT,
+            order_id TEXT,
+            intent TEXT,
+            success INTEGER NOT NULL CHECK(success IN (0, 1)),
+            result_json TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    # "last action for slug X" lookups; existing DBs pick this up on next start
+    c.execute("CREATE INDEX IF NOT EXISTS idx_actions_slug_created ON actions(convo_slug, created_at DESC)")
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS classifier_cache(
+            key BLOB PRIMARY KEY,
+            val BLOB
+        )
+    """)
+    _CONN = c
+    atexit.register(_close)
+
+    _WRITER = threading.Thread(target=_drain, name="cancelbot-db-writer", daemon=True)
+    _WRITER.start()
+    atexit.register(_shutdown)  # runs before _close (atexit is LIFO)
+
+def _write_batch(rows):
+    with _LOCK:
+        try:
+            _CONN.execute("BEGIN")
+            _CONN.executemany(_INSERT_SQL, rows)
+            _CONN.execute("COMMIT")
+        except sqlite3.Error as e:
+            if _CONN.in_transaction:
+                _CONN.execute("ROLLBACK")
+            print(f"[DB] Failed to log {len(rows)} action(s): {e}")
+
+def _drain():
+    while True:
+        batch = [_Q.get()]
+        while len(batch) < _BATCH_MAX:
+            try:
+                batch.append(_Q.get_nowait())
+            except queue.Empty:
+                break
+        rows = [b for b in batch if b is not _STOP]
+        if rows:
+            global _IN_FLIGHT
+            _IN_FLIGHT = len(rows)
+            _write_batch(rows)
+            _IN_FLIGHT = 0
+        for _ in batch:
+            _Q.task_done()
+        if len(rows) != len(batch):
+            return
+
+def _shutdown():
+    if _WRITER is not None and _WRITER.is_alive():
+        _Q.put(_STOP)
+        _WRITER.join(timeout=5)
+        if _WRITER.is_alive():
+            # queued rows (the _STOP marker may still be among them) + the batch being written
+            pending = _IN_FLIGHT + sum(1 for item in list(_Q.queue) if item is not _STOP)
+            print(f"[DB] Failed to log {pending} action(s): writer still busy at exit (queue size {_Q.qsize()})")
+
+def _close():
+    # Take the lock so we never close under a batch the writer is still committing
+    with _LOCK:
+        _CONN.close()
+
+def flush():
+    """Block until every queued action has been written."""
+    if _WRITER is not None and _WRITER.is_alive():
+        _Q.join()
 
 def log_action(convo_slug: str, order_id: Optional[str], intent: str, success: bool, result: dict):
-    with sqlite3.connect(_DB) as c:
-        c.execute(
-            "INSERT INTO actions(convo_slug, order_id, intent, success, result_json) VALUES (?, ?, ?, ?, ?)",
-            (convo_slug, order_id, intent, 1 if success else 0, json.dumps(result)),
-        )
+    if _CONN is None:
+        init_db()
+    # Encode now so later mutation of `result` can't leak into the log row
+    _Q.put_nowait((convo_slug, order_id, intent, 1 if success else 0, orjson.dumps(result).decode()))
+
+def classifier_cache_get(key: bytes) -> Optional[bytes]:
+    if _CONN is None:
+        init_db()
+    try:
+        with _LOCK:
+            row = _CONN.execute("SELECT val FROM classifier_cache WHERE key = ?", (key,)).fetchone()
+    except sqlite3.Error as e:
+        print(f"[DB] Classifier cache read failed: {e}")
+        return None
+    return row[0] if row else None
+
+def classifier_cache_put(key: bytes, val: bytes):
+    if _CONN is None:
+        init_db()
+    try:
+        with _LOCK:
+            _CONN.execute("INSERT OR REPLACE INTO classifier_cache(key, val) VALUES (?, ?)", (key, val))
+    except sqlite3.Error as e:
+        print(f"[DB] Classifier cache write failed: {e}")
@@ -1,24 +1,43 @@
 # utils.py
 import os
+import functools
 import yaml
 import re
 
+try:
+    from yaml import CSafeLoader as _SafeLoader  # libyaml, much faster when available
+except ImportError:
+    from yaml import SafeLoader as _SafeLoader
+
+# Strip everything but 0-9; translate() is the fast path for ASCII input
+_NONDIGIT = re.compile(r"[^\d]")
+_DIGITS_ONLY = str.maketrans("", "", "".join(chr(c) for c in range(128) if not chr(c).isdigit()))
+
+@functools.lru_cache(maxsize=4)
+def _load(path: str, mtime: float) -> dict:
+    # mtime is only part of the cache key, so editing rules.yaml busts the cache
+    with open(path, "r") as f:
+        return yaml.load(f, Loader=_SafeLoader) or {}
+
 def load_rules() -> dict:
+    """Parsed rules.yaml, cached until the file changes. Treat the result as read-only."""
     path = os.path.join(os.getcwd(), "rules.yaml")
-    if not os.path.exists(path):
+    try:
+        mtime = os.stat(path).st_mtime
+    except FileNotFoundError:
         return {"assignee": None, "tags": {"success": [], "failure": [], "not_cancellation": []}, "dry_run": True}
-    with open(path, "r") as f:
-        return yaml.safe_load(f) or {}
+    return _load(path, mtime)
 
 def normalize_shopify_order_id(s: str) -> str:
     s = s.strip()
     if not s:
         return s
     # Try to coerce "91057" -> "Shopify #91057.1"
-    digits = re.sub(r"[^\d]", "", s)
-    if digits and (digits == s or s.lower().startswith("order") or s.lower().startswith("shopify")):
+    digits = s.translate(_DIGITS_ONLY) if s.isascii() else _NONDIGIT.sub("", s)
+    low = s.lower()
+    if digits and (digits == s or low.startswith("order") or low.startswith("shopify")):
         return f"Shopify #{digits}.1"
     # Already "Shopify #12345" -> ensure ".1"
-    if s.lower().startswith("shopify #") and ".1" not in s:
+    if low.startswith("shopify #") and ".1" not in s:
         return s + ".1"
     return s